@@ -109,7 +109,7 @@ export default function MethodologyModal({ isOpen, onClose }: MethodologyModalPr
                                     <div className="flex gap-4 items-start">
                                         <div className="font-mono text-xs text-slate-500 min-w-[80px]">Index</div>
                                         <div className="text-sm text-slate-300">
-                                            <strong>FAISS:</strong> Using <code>IndexFlatL2</code> (Euclidean Distance). It stores 10,000+ vectors generated from EEG features + metadata narratives.
+                                            <strong>FAISS:</strong> Using <code>IndexHNSWSQ</code> (approximate Cosine Similarity search over 8-bit quantized, normalized embeddings). It stores 10,000+ vectors generated from EEG features + metadata narratives.
                                         </div>
                                     </div>
                                     <div className="flex gap-4 items-start">
@@ -7,16 +7,31 @@ Generates: eeg_features.parquet, eeg_subjects.parquet, eeg_vectors.faiss
 
 import os
 import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 import pandas as pd
 import polars as pl
 import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import numba
+from joblib import Parallel, delayed
 from scipy import stats, signal
-from scipy.stats import skew, kurtosis
-from sentence_transformers import SentenceTransformer
-import faiss
+from scipy import fft as sp_fft
+
+# Optional: route scipy FFTs (Welch) through FFTW. Transforms stay
+# single-threaded (scipy's default workers=1); subjects already run in
+# parallel worker processes
+try:
+    import pyfftw
+    sp_fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+    pyfftw.interfaces.cache.enable()
+    FFT_BACKEND = "pyfftw"
+except ImportError:
+    FFT_BACKEND = "scipy"
 
 # ============================================================================
 # CONFIG
@@ -24,6 +39,10 @@ import faiss
 DATASET_DIR = Path("dataset")
 PUBLIC_DIR = Path("public")
 PUBLIC_DIR.mkdir(exist_ok=True)
+CACHE_DIR = Path(".cache")  # intermediate artifacts (not deployed)
+CACHE_DIR.mkdir(exist_ok=True)
+BRONZE_CACHE = CACHE_DIR / "bronze.arrow"
+BRONZE_CACHE_META = CACHE_DIR / "bronze.json"
 
 # 19 EEG channels (International 10/20 montage)
 EEG_CHANNELS = [
@@ -45,16 +64,124 @@ SAMPLING_RATE = 250  # Hz (assumed standard)
 WINDOW_SIZE = 2.0  # seconds
 WINDOW_OVERLAP = 0.5  # 50% overlap
 
+# Also materialize the long-format bronze_eeg table (SQL debugging only)
+KEEP_BRONZE_TABLE = False
+
+# Welch segment length, Hann taper and the matching frequency grid
+NPERSEG = 256
+HANN = signal.windows.hann(NPERSEG, sym=False)
+WIN_NORM = (HANN ** 2).sum()
+FREQS = np.fft.rfftfreq(NPERSEG, 1 / SAMPLING_RATE)
+
+# Per-channel window features, in output column order
+FEATURE_COLUMNS = [
+    'mean_val', 'var_val', 'min_val', 'max_val',
+    'skewness', 'kurtosis', 'energy',
+    *[f'{band_name}_power' for band_name in BANDS],
+    'spectral_entropy', 'dfa_alpha'
+]
+
+FEATURE_SCHEMA = pa.schema(
+    [('channel', pa.string())]
+    + [(name, pa.float64()) for name in FEATURE_COLUMNS]
+    + [
+        ('subject', pa.string()),
+        ('window_idx', pa.int64()),
+        ('window_start', pa.float64()),
+        ('window_end', pa.float64()),
+    ]
+)
+
 print("🧠 EEG Cognitive Workload Pipeline Starting...")
 print(f"Expected channels: {len(EEG_CHANNELS)}")
 print(f"Window: {WINDOW_SIZE}s with {WINDOW_OVERLAP*100}% overlap")
+print(f"FFT backend: {FFT_BACKEND}")
 
 # ============================================================================
 # BRONZE LAYER: Raw EEG Data Ingestion
 # ============================================================================
 
-def load_raw_eeg_data(con: duckdb.DuckDBPyConnection) -> None:
-    """Load all 36 CSV files into Bronze layer"""
+def _read_bronze_csvs(csv_files: List[Path]) -> Dict[str, np.ndarray]:
+    """Parse subject CSVs into float32 (n_samples, n_channels) matrices"""
+    def read_subject_csv(csv_path: Path) -> np.ndarray:
+        # Each file's width comes from its first row, so the schema is per file
+        with open(csv_path) as f:
+            n_cols = len(f.readline().split(','))
+        
+        if n_cols != len(EEG_CHANNELS):
+            print(f"⚠️  WARNING: {csv_path.name} has {n_cols} columns but expected {len(EEG_CHANNELS)}")
+            print(f"Using first {min(n_cols, len(EEG_CHANNELS))} channels")
+        
+        schema = {f"column_{i + 1}": pl.Float32 for i in range(n_cols)}
+        df = pl.read_csv(csv_path, has_header=False, schema=schema)
+        return df.select(df.columns[:len(EEG_CHANNELS)]).to_numpy()
+    
+    # Polars parses natively and releases the GIL, so files load concurrently
+    with ThreadPoolExecutor() as pool:
+        arrays = list(pool.map(read_subject_csv, csv_files))
+    
+    # One float32 (n_samples, n_channels) matrix per subject
+    subject_arrays = {}
+    
+    for csv_path, eeg in zip(csv_files, arrays):
+        subject_id = csv_path.stem  # e.g., 's00'
+        subject_arrays[subject_id] = eeg
+        print(f"  ✓ Loaded {subject_id}: {len(eeg)} samples ({len(eeg)/SAMPLING_RATE:.1f}s)")
+    
+    return subject_arrays
+
+def _bronze_cache_sources(csv_files: List[Path]) -> Dict[str, int]:
+    """Cache key: source CSV names and modification times"""
+    return {csv_path.name: csv_path.stat().st_mtime_ns for csv_path in csv_files}
+
+def _load_bronze_cache(csv_files: List[Path]) -> Optional[Dict[str, np.ndarray]]:
+    """Memory-map cached subject matrices if they are fresh for these CSVs"""
+    if not (BRONZE_CACHE.exists() and BRONZE_CACHE_META.exists()):
+        return None
+    
+    # Any unreadable, truncated or old-layout cache is treated as a miss
+    try:
+        meta = json.loads(BRONZE_CACHE_META.read_text())
+        if meta.get('sources') != _bronze_cache_sources(csv_files):
+            return None
+        
+        # One record batch per subject holding its channel-major flattened matrix;
+        # the numpy views point straight into the OS page cache
+        reader = pa.ipc.open_file(pa.memory_map(str(BRONZE_CACHE)))
+        n_subjects = len(meta['subjects'])
+        if len(meta['n_channels']) != n_subjects or reader.num_record_batches != n_subjects:
+            return None
+        
+        subject_arrays = {}
+        for i, (subject_id, n_channels) in enumerate(zip(meta['subjects'], meta['n_channels'])):
+            flat = reader.get_batch(i).column(0).to_numpy(zero_copy_only=True)
+            if n_channels <= 0 or len(flat) % n_channels:
+                return None
+            subject_arrays[subject_id] = flat.reshape(n_channels, len(flat) // n_channels).T
+    except Exception as e:
+        print(f"  ! Ignoring unreadable Bronze cache ({e})")
+        return None
+    
+    return subject_arrays
+
+def _write_bronze_cache(csv_files: List[Path], subject_arrays: Dict[str, np.ndarray]) -> None:
+    """Persist subject matrices as Arrow IPC plus a JSON sidecar with the cache key"""
+    # Sidecar goes last, so a half-written cache is never considered fresh
+    BRONZE_CACHE_META.unlink(missing_ok=True)
+    
+    schema = pa.schema([('eeg', pa.float32())])
+    with pa.ipc.new_file(str(BRONZE_CACHE), schema) as writer:
+        for eeg in subject_arrays.values():
+            writer.write_batch(pa.record_batch([pa.array(eeg.ravel(order='F'))], schema=schema))
+    
+    BRONZE_CACHE_META.write_text(json.dumps({
+        'sources': _bronze_cache_sources(csv_files),
+        'subjects': list(subject_arrays),
+        'n_channels': [eeg.shape[1] for eeg in subject_arrays.values()],
+    }, indent=2))
+
+def load_raw_eeg_data(con: duckdb.DuckDBPyConnection) -> Dict[str, np.ndarray]:
+    """Load all 36 CSV files into Bronze layer as per-subject channel matrices"""
     print("\n[BRONZE] Loading raw EEG data...")
     
     csv_files = sorted(DATASET_DIR.glob("s*.csv"))[:5] # Limit to 5 for portfolio build
@@ -63,61 +190,135 @@ def load_raw_eeg_data(con: duckdb.DuckDBPyConnection) -> None:
     if len(csv_files) == 0:
         raise FileNotFoundError(f"No CSV files found in {DATASET_DIR}")
     
-    # Load first file to determine structure
-    first_df = pd.read_csv(csv_files[0], header=None)
-    n_cols = first_df.shape[1]
+    subject_arrays = _load_bronze_cache(csv_files)
     
-    if n_cols != len(EEG_CHANNELS):
-        print(f"⚠️  WARNING: CSV has {n_cols} columns but expected {len(EEG_CHANNELS)}")
-        print(f"Using first {min(n_cols, len(EEG_CHANNELS))} channels")
+    if subject_arrays is not None:
+        print(f"  ✓ Bronze cache is fresh, memory-mapping {BRONZE_CACHE}")
+        for subject_id, eeg in subject_arrays.items():
+            print(f"  ✓ Loaded {subject_id}: {len(eeg)} samples ({len(eeg)/SAMPLING_RATE:.1f}s)")
+    else:
+        subject_arrays = _read_bronze_csvs(csv_files)
+        _write_bronze_cache(csv_files, subject_arrays)
     
-    # Create unified raw table
-    all_data = []
-    
-    for csv_path in csv_files:
-        subject_id = csv_path.stem  # e.g., 's00'
-        df = pd.read_csv(csv_path, header=None)
-        
-        # Assign channel names
-        df.columns = EEG_CHANNELS[:df.shape[1]]
-        df['subject'] = subject_id
-        df['sample_idx'] = np.arange(len(df))
-        df['time_sec'] = df['sample_idx'] / SAMPLING_RATE
-        
-        all_data.append(df)
-        print(f"  ✓ Loaded {subject_id}: {len(df)} samples ({len(df)/SAMPLING_RATE:.1f}s)")
-    
-    # Combine all subjects
-    raw_eeg = pd.concat(all_data, ignore_index=True)
-    
-    # Register in DuckDB
-    con.register('raw_eeg', raw_eeg)
+    # Small per-subject metadata table
+    subjects_meta = pd.DataFrame({
+        'subject': list(subject_arrays),
+        'n_samples': [len(eeg) for eeg in subject_arrays.values()],
+    })
+    con.register('subjects_meta', subjects_meta)
     con.execute("""
-        CREATE OR REPLACE TABLE bronze_eeg AS 
-        SELECT * FROM raw_eeg
+        CREATE OR REPLACE TABLE bronze_subjects AS 
+        SELECT * FROM subjects_meta
     """)
     
-    total_samples = con.execute("SELECT COUNT(*) FROM bronze_eeg").fetchone()[0]
-    total_subjects = con.execute("SELECT COUNT(DISTINCT subject) FROM bronze_eeg").fetchone()[0]
+    # Long-format sample table, only needed for ad-hoc SQL debugging
+    if KEEP_BRONZE_TABLE:
+        # Arrow tables wrap the float32 columns without a pandas upcast
+        raw_eeg = pa.concat_tables([
+            pa.table({
+                **{channel: eeg[:, i] for i, channel in enumerate(EEG_CHANNELS[:eeg.shape[1]])},
+                'subject': pa.repeat(subject_id, len(eeg)),
+            })
+            for subject_id, eeg in subject_arrays.items()
+        ], promote_options='default')  # subjects may have different channel counts
+        
+        con.register('raw_eeg', raw_eeg)
+        con.execute("""
+            CREATE OR REPLACE TABLE bronze_eeg AS 
+            SELECT * FROM raw_eeg
+        """)
+    
+    total_samples = int(subjects_meta['n_samples'].sum())
+    total_subjects = len(subjects_meta)
     
     print(f"\n✅ Bronze layer: {total_samples:,} samples from {total_subjects} subjects")
+    
+    return subject_arrays
 
 # ============================================================================
 # SILVER LAYER: Feature Engineering
 # ============================================================================
 
-def compute_bandpower(data: np.ndarray, fs: float, band: Tuple[float, float]) -> float:
-    """Compute bandpower using Welch's method"""
-    freqs, psd = signal.welch(data, fs, nperseg=min(256, len(data)))
-    idx_band = np.logical_and(freqs >= band[0], freqs <= band[1])
-    return np.trapz(psd[idx_band], freqs[idx_band])
+def welch_batched(data: np.ndarray, fs: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Welch PSD for every channel of a (n_channels, n_samples) window with one batched rfft"""
+    n_samples = data.shape[-1]
+    if n_samples < NPERSEG or fs != SAMPLING_RATE:
+        return signal.welch(data, fs, nperseg=min(NPERSEG, n_samples), axis=-1)
+    
+    # Same estimate as signal.welch defaults (Hann, 50% overlap, constant detrend,
+    # mean over segments) without its per-call setup: all channels' segments
+    # go through a single rfft on a (n_channels, n_segments, NPERSEG) array
+    segments = np.lib.stride_tricks.sliding_window_view(data, NPERSEG, axis=-1)[..., ::NPERSEG // 2, :]
+    segments = (segments - segments.mean(axis=-1, keepdims=True)) * HANN
+    psd = (np.abs(sp_fft.rfft(segments, axis=-1)) ** 2).mean(axis=-2) / (fs * WIN_NORM)
+    psd[..., 1:-1] *= 2  # one-sided spectrum (NPERSEG is even)
+    return FREQS, psd
+
+def band_weights(freqs: np.ndarray) -> np.ndarray:
+    """(n_freqs, n_bands) trapezoid weights, so psd @ weights integrates every band"""
+    weights = np.zeros((len(freqs), len(BANDS)))
+    for j, (lo, hi) in enumerate(BANDS.values()):
+        idx = np.flatnonzero((freqs >= lo) & (freqs <= hi))
+        half_dx = np.diff(freqs[idx]) / 2
+        weights[idx[:-1], j] += half_dx
+        weights[idx[1:], j] += half_dx
+    return weights
+
+BAND_WEIGHTS = band_weights(FREQS)
 
-def compute_spectral_entropy(data: np.ndarray, fs: float) -> float:
-    """Compute spectral entropy"""
-    freqs, psd = signal.welch(data, fs, nperseg=min(256, len(data)))
-    psd_norm = psd / psd.sum()
-    psd_norm = psd_norm[psd_norm > 0]
-    return -np.sum(psd_norm * np.log2(psd_norm))
+def compute_bandpower(psd: np.ndarray, freqs: np.ndarray) -> Dict[str, np.ndarray]:
+    """Integrate a batched PSD over each frequency band with one matmul"""
+    weights = BAND_WEIGHTS if np.array_equal(freqs, FREQS) else band_weights(freqs)
+    return dict(zip(BANDS, (psd @ weights).T))
+
+def compute_spectral_entropy(psd: np.ndarray) -> np.ndarray:
+    """Compute spectral entropy per channel of a batched PSD"""
+    total = psd.sum(axis=-1, keepdims=True)
+    psd_norm = np.divide(psd, total, where=total > 0, out=np.zeros_like(psd))
+    log_psd = np.log2(psd_norm, where=psd_norm > 0, out=np.zeros_like(psd_norm))
+    return -np.sum(psd_norm * log_psd, axis=-1)
+
+@numba.njit(cache=True, fastmath=True)
+def _dfa_core(y: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Mean detrended RMS fluctuation of the profile y at each scale"""
+    N = len(y)
+    flucts = np.empty(len(scales))
+    n_flucts = 0
+    
+    for scale in scales:
+        segments = N // scale
+        if segments < 1 or scale < 2:
+            continue
+        
+        # Closed-form least-squares line fit against x = 0..scale-1; the x sums
+        # depend only on the scale, so only sum(y) and sum(x*y) vary per segment
+        sx = scale * (scale - 1) / 2.0
+        sxx = (scale - 1) * scale * (2 * scale - 1) / 6.0
+        denom = scale * sxx - sx * sx
+        
+        F_sum = 0.0
+        for i in range(segments):
+            offset = i * scale
+            
+            sy = 0.0
+            sxy = 0.0
+            for j in range(scale):
+                yj = y[offset + j]
+                sy += yj
+                sxy += j * yj
+            slope = (scale * sxy - sx * sy) / denom
+            intercept = (sy - slope * sx) / scale
+            
+            sq_resid = 0.0
+            for j in range(scale):
+                resid = y[offset + j] - (slope * j + intercept)
+                sq_resid += resid * resid
+            F_sum += np.sqrt(sq_resid / scale)
+        
+        flucts[n_flucts] = F_sum / segments
+        n_flucts += 1
+    
+    return flucts[:n_flucts]
 
 def compute_dfa(data: np.ndarray) -> float:
     """Detrended Fluctuation Analysis (simplified)"""
@@ -130,26 +331,8 @@ def compute_dfa(data: np.ndarray) -> float:
         y = np.cumsum(data - np.mean(data))
         
         # Calculate fluctuation
-        scales = np.logspace(1, np.log10(N//4), 8).astype(int)
-        flucts = []
-        
-        for scale in scales:
-            segments = N // scale
-            if segments < 1:
-                continue
-            
-            F = []
-            for i in range(segments):
-                segment = y[i*scale:(i+1)*scale]
-                if len(segment) < 2:
-                    continue
-                x = np.arange(len(segment))
-                fit = np.polyfit(x, segment, 1)
-                trend = np.polyval(fit, x)
-                F.append(np.sqrt(np.mean((segment - trend)**2)))
-            
-            if F:
-                flucts.append(np.mean(F))
+        scales = np.logspace(1, np.log10(N//4), 8).astype(np.int64)
+        flucts = _dfa_core(y, scales)
         
         if len(flucts) < 2:
             return 0.0
@@ -163,28 +346,89 @@ def compute_dfa(data: np.ndarray) -> float:
     except:
         return 0.0
 
-def extract_window_features(window_data: np.ndarray, channel: str, fs: float) -> Dict:
-    """Extract all features from a single window"""
+@numba.njit(cache=True, fastmath=True)
+def stats_kernel(data: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Time-domain stats per channel of a (n_channels, n_samples) window in one fused kernel"""
+    n_channels, n_samples = data.shape
+    mean = np.empty(n_channels)
+    var = np.empty(n_channels)
+    mn = np.empty(n_channels)
+    mx = np.empty(n_channels)
+    skewness = np.empty(n_channels)
+    kurt = np.empty(n_channels)
+    energy = np.empty(n_channels)
+    
+    for c in range(n_channels):
+        # Pass 1: sum, energy, extrema
+        s1 = 0.0
+        s2 = 0.0
+        lo = data[c, 0]
+        hi = data[c, 0]
+        for t in range(n_samples):
+            v = data[c, t]
+            s1 += v
+            s2 += v * v
+            lo = min(lo, v)
+            hi = max(hi, v)
+        mu = s1 / n_samples
+        
+        # Pass 2: central moments (stable for near-constant channels)
+        m2 = 0.0
+        m3 = 0.0
+        m4 = 0.0
+        for t in range(n_samples):
+            d = data[c, t] - mu
+            d2 = d * d
+            m2 += d2
+            m3 += d2 * d
+            m4 += d2 * d2
+        m2 /= n_samples
+        m3 /= n_samples
+        m4 /= n_samples
+        
+        mean[c] = mu
+        var[c] = m2
+        mn[c] = lo
+        mx[c] = hi
+        energy[c] = s2
+        
+        # Biased skew / Fisher kurtosis, NaN for constant channels like scipy.stats
+        # (threshold: 10 * float64 resolution relative to the mean)
+        if m2 <= (1e-14 * mu) ** 2:
+            skewness[c] = np.nan
+            kurt[c] = np.nan
+        else:
+            skewness[c] = m3 / m2 ** 1.5
+            kurt[c] = m4 / (m2 * m2) - 3.0
+    
+    return mean, var, mn, mx, skewness, kurt, energy
+
+def extract_window_features(window_data: np.ndarray, fs: float) -> Dict[str, np.ndarray]:
+    """Extract all features from a single (n_channels, n_samples) window, one value per channel"""
+    # One Welch call covers every channel; the PSD is shared by bands and entropy
+    freqs, psd = welch_batched(window_data, fs)
+    band_powers = compute_bandpower(psd, freqs)
+    mean, var, mn, mx, skewness, kurt, energy = stats_kernel(window_data)
+    
     features = {
-        'channel': channel,
-        'mean_val': float(np.mean(window_data)),
-        'var_val': float(np.var(window_data)),
-        'min_val': float(np.min(window_data)),
-        'max_val': float(np.max(window_data)),
-        'skewness': float(skew(window_data)),
-        'kurtosis': float(kurtosis(window_data)),
-        'energy': float(np.sum(window_data ** 2)),
+        'mean_val': mean,
+        'var_val': var,
+        'min_val': mn,
+        'max_val': mx,
+        'skewness': skewness,
+        'kurtosis': kurt,
+        'energy': energy,
     }
     
     # Bandpower for each frequency band
-    for band_name, band_range in BANDS.items():
-        features[f'{band_name}_power'] = float(compute_bandpower(window_data, fs, band_range))
+    for band_name in BANDS:
+        features[f'{band_name}_power'] = band_powers[band_name]
     
     # Spectral entropy
-    features['spectral_entropy'] = float(compute_spectral_entropy(window_data, fs))
+    features['spectral_entropy'] = compute_spectral_entropy(psd)
     
     # DFA alpha
-    features['dfa_alpha'] = float(compute_dfa(window_data))
+    features['dfa_alpha'] = np.array([compute_dfa(channel_data) for channel_data in window_data])
     
     return features
 
@@ -195,7 +439,7 @@ from sklearn.decomposition import PCA
 # ... existing imports ...
 
 def compute_clusters(df: pd.DataFrame) -> pd.DataFrame:
-    """Apply K-Means and PCA to feature vectors"""
+    """Apply K-Means and PCA to feature vectors, returning one row per window"""
     print("\n[ML] Computing Cognitive State Clusters...")
     
     # Select features for clustering
@@ -213,14 +457,11 @@ def compute_clusters(df: pd.DataFrame) -> pd.DataFrame:
     print("  Pivoting for whole-brain state analysis...")
     pivot_cols = ['alpha_power', 'beta_power', 'theta_power', 'delta_power', 'spectral_entropy']
     
-    # We need a unique ID for each window
-    df['window_uid'] = df['subject'] + '_' + df['window_idx'].astype(str)
-    
-    # Pivot: Index=window_uid, Columns=Channel*Feature
+    # Pivot: Index=(subject, window_idx), Columns=Channel*Feature
     # This might be heavy. Let's try clustering row-wise (Channel State) first?
     # No, "Cognitive State" is global.
     
-    wide_df = df.pivot(index='window_uid', columns='channel', values=pivot_cols)
+    wide_df = df.pivot(index=['subject', 'window_idx'], columns='channel', values=pivot_cols)
     wide_df.columns = [f"{c[1]}_{c[0]}" for c in wide_df.columns] # Flatten (e.g. Fp1_alpha)
     
     # Drop rows with NaNs
@@ -228,7 +469,13 @@ def compute_clusters(df: pd.DataFrame) -> pd.DataFrame:
     
     if len(wide_df) < 50:
         print("  ! Not enough data for clustering")
-        return df
+        return pd.DataFrame({
+            'subject': pd.Series(dtype=str),
+            'window_idx': pd.Series(dtype='int64'),
+            'cluster_id': pd.Series(dtype='int64'),
+            'pca_x': pd.Series(dtype='float64'),
+            'pca_y': pd.Series(dtype='float64')
+        })
     
     # 2. Scale
     scaler = StandardScaler()
@@ -243,92 +490,105 @@ def compute_clusters(df: pd.DataFrame) -> pd.DataFrame:
     kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
     clusters = kmeans.fit_predict(X)
     
-    # 5. Join back
+    # 5. One row per window, joined back onto the features in DuckDB
     results = pd.DataFrame({
-        'window_uid': wide_df.index,
-        'cluster_id': clusters,
+        'subject': wide_df.index.get_level_values('subject'),
+        'window_idx': wide_df.index.get_level_values('window_idx').astype('int64'),
+        'cluster_id': clusters.astype('int64'),
         'pca_x': X_pca[:, 0],
         'pca_y': X_pca[:, 1]
     })
     
     print(f"  ✓ Clustered {len(results)} windows into 4 states")
     
-    # Merge back to original long DF
-    merged = df.merge(results, on='window_uid', how='left')
-    
-    # Fill NaN for windows that were dropped (if any) with -1
-    merged['cluster_id'] = merged['cluster_id'].fillna(-1).astype(int)
-    merged['pca_x'] = merged['pca_x'].fillna(0.0)
-    merged['pca_y'] = merged['pca_y'].fillna(0.0)
-    
-    return merged.drop(columns=['window_uid'])
+    return results
 
-def create_silver_features(con: duckdb.DuckDBPyConnection) -> pd.DataFrame:
-    """Window EEG data and extract features"""
-    print("\n[SILVER] Extracting windowed features...")
-    
-    # Get raw data
-    raw_df = con.execute("SELECT * FROM bronze_eeg").fetch_df()
-    
-    subjects = raw_df['subject'].unique()
+def _process_subject(eeg: np.ndarray, subject: str) -> pa.RecordBatch:
+    """Slide windows over one subject's recording and extract features as a column batch"""
+    n_samples, n_channels = eeg.shape
     window_samples = int(WINDOW_SIZE * SAMPLING_RATE)
     step_samples = int(window_samples * (1 - WINDOW_OVERLAP))
+    n_windows = max(0, (n_samples - window_samples) // step_samples + 1)
     
-    all_features = []
+    print(f"  Processing {subject} ({n_samples} samples)...")
     
-    for subject in subjects:
-        subject_data = raw_df[raw_df['subject'] == subject]
-        n_samples = len(subject_data)
-        
-        print(f"  Processing {subject} ({n_samples} samples)...")
+    # (n_windows, n_channels) array per feature, filled one window row at a time
+    features = {name: np.empty((n_windows, n_channels)) for name in FEATURE_COLUMNS}
+    
+    if n_windows > 0:
+        # Zero-copy (n_windows, n_channels, window_samples) view of the subject matrix
+        windows = np.lib.stride_tricks.sliding_window_view(eeg, window_samples, axis=0)[::step_samples]
         
-        # Slide windows
-        window_count = 0
-        for start_idx in range(0, n_samples - window_samples + 1, step_samples):
-            end_idx = start_idx + window_samples
-            window_slice = subject_data.iloc[start_idx:end_idx]
-            
-            window_start = window_slice['time_sec'].iloc[0]
-            window_end = window_slice['time_sec'].iloc[-1]
-            
-            # Extract features for each channel
-            for channel in EEG_CHANNELS:
-                if channel not in window_slice.columns:
-                    continue
-                    
-                channel_data = window_slice[channel].values
-                
-                if len(channel_data) < 10:
-                    continue
-                
-                features = extract_window_features(channel_data, channel, SAMPLING_RATE)
-                features['subject'] = subject
-                features['window_idx'] = window_count
-                features['window_start'] = window_start
-                features['window_end'] = window_end
-                
-                all_features.append(features)
+        for window_idx in range(n_windows):
+            # Features are computed in float64 on the small per-window copy
+            window_data = windows[window_idx].astype(np.float64)
             
-            window_count += 1
-        
-        print(f"    ✓ {window_count} windows extracted")
+            for name, values in extract_window_features(window_data, SAMPLING_RATE).items():
+                features[name][window_idx] = values
+    
+    print(f"    ✓ {subject}: {n_windows} windows extracted")
+    
+    # One row per (window, channel), window-major. Undefined features (NaN,
+    # e.g. skew of a flat channel) are stored as NULL so SQL aggregates skip them
+    start_idx = np.arange(n_windows) * step_samples
+    columns = {
+        'channel': EEG_CHANNELS[:n_channels] * n_windows,
+        **{name: pa.array(values.ravel(), from_pandas=True) for name, values in features.items()},
+        'subject': [subject] * (n_windows * n_channels),
+        'window_idx': np.repeat(np.arange(n_windows), n_channels),
+        'window_start': np.repeat(start_idx / SAMPLING_RATE, n_channels),
+        'window_end': np.repeat((start_idx + window_samples - 1) / SAMPLING_RATE, n_channels),
+    }
+    
+    return pa.RecordBatch.from_pydict(columns, schema=FEATURE_SCHEMA)
+
+def create_silver_features(con: duckdb.DuckDBPyConnection, subject_arrays: Dict[str, np.ndarray]) -> None:
+    """Window EEG data and extract features"""
+    print("\n[SILVER] Extracting windowed features...")
+    
+    features_path = CACHE_DIR / "silver_features.parquet"
     
-    features_df = pd.DataFrame(all_features)
+    # Subjects are independent, so fan them out across worker processes and
+    # stream each subject's batch to Parquet as it arrives
+    batches = Parallel(n_jobs=-1, backend='loky', return_as='generator')(
+        delayed(_process_subject)(eeg, subject)
+        for subject, eeg in subject_arrays.items()
+    )
+    with pq.ParquetWriter(features_path, FEATURE_SCHEMA) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
     
     # --- ML STEP ---
-    features_df = compute_clusters(features_df)
+    # Only the pivot columns are read back; clusters come out one row per window
+    cluster_input = con.execute(f"""
+        SELECT subject, window_idx, channel,
+               alpha_power, beta_power, theta_power, delta_power, spectral_entropy
+        FROM read_parquet('{features_path}')
+    """).fetch_df()
+    clusters_df = compute_clusters(cluster_input)
     # ----------------
     
-    # Register in DuckDB
-    con.register('silver_features', features_df)
+    # Silver is a view over the Parquet file; windows dropped from clustering
+    # (if any) get cluster -1 at the origin
+    con.register('window_clusters', clusters_df)
     con.execute("""
-        CREATE OR REPLACE TABLE silver_eeg_features AS 
-        SELECT * FROM silver_features
+        CREATE OR REPLACE TABLE silver_clusters AS 
+        SELECT * FROM window_clusters
+    """)
+    con.execute(f"""
+        CREATE OR REPLACE VIEW silver_eeg_features AS
+        SELECT
+            f.* EXCLUDE (file_row_number),
+            COALESCE(c.cluster_id, -1) AS cluster_id,
+            COALESCE(c.pca_x, 0.0) AS pca_x,
+            COALESCE(c.pca_y, 0.0) AS pca_y
+        FROM read_parquet('{features_path}', file_row_number = true) f
+        LEFT JOIN silver_clusters c USING (subject, window_idx)
+        ORDER BY f.file_row_number
     """)
     
-    print(f"\n✅ Silver layer: {len(features_df):,} feature vectors")
-    
-    return features_df
+    n_rows = con.execute("SELECT COUNT(*) FROM silver_eeg_features").fetchone()[0]
+    print(f"\n✅ Silver layer: {n_rows:,} feature vectors")
 
 # ============================================================================
 # GOLD LAYER: Analytics Marts
@@ -338,11 +598,13 @@ def create_gold_layer(con: duckdb.DuckDBPyConnection) -> None:
     """Create analytics marts for agent queries"""
     print("\n[GOLD] Creating analytics marts...")
     
-    # Workload statistics by channel
+    # Channel- and subject-level aggregates in a single scan of Silver
     con.execute("""
-        CREATE OR REPLACE TABLE gold_workload_stats AS
+        CREATE OR REPLACE TEMP TABLE gold_grouped_stats AS
         SELECT
+            GROUPING(channel, subject) AS grouping_id,
             channel,
+            subject,
             AVG(mean_val) AS avg_mean,
             AVG(var_val) AS avg_variance,
             AVG(alpha_power) AS avg_alpha,
@@ -354,28 +616,52 @@ def create_gold_layer(con: duckdb.DuckDBPyConnection) -> None:
             AVG(dfa_alpha) AS avg_dfa,
             STDDEV(alpha_power) AS std_alpha,
             STDDEV(beta_power) AS std_beta,
-            COUNT(*) as n_windows
+            COUNT(*) AS n_rows,
+            COUNT(DISTINCT window_idx) AS n_distinct_windows
         FROM silver_eeg_features
-        GROUP BY channel
+        GROUP BY GROUPING SETS ((channel), (subject))
+    """)
+    
+    # Workload statistics by channel (subject rolled up)
+    con.execute("""
+        CREATE OR REPLACE TABLE gold_workload_stats AS
+        SELECT
+            channel,
+            avg_mean,
+            avg_variance,
+            avg_alpha,
+            avg_beta,
+            avg_theta,
+            avg_delta,
+            avg_gamma,
+            avg_spectral_entropy,
+            avg_dfa,
+            std_alpha,
+            std_beta,
+            n_rows AS n_windows
+        FROM gold_grouped_stats
+        WHERE grouping_id = 1
         ORDER BY avg_beta DESC
     """)
     
-    # Subject-level statistics
+    # Subject-level statistics (channel rolled up)
     con.execute("""
         CREATE OR REPLACE TABLE gold_subject_stats AS
         SELECT
             subject,
-            COUNT(DISTINCT window_idx) AS n_windows,
-            AVG(alpha_power) AS avg_alpha,
-            AVG(beta_power) AS avg_beta,
-            AVG(theta_power) AS avg_theta,
-            AVG(dfa_alpha) AS avg_dfa,
-            AVG(spectral_entropy) AS avg_entropy
-        FROM silver_eeg_features
-        GROUP BY subject
+            n_distinct_windows AS n_windows,
+            avg_alpha,
+            avg_beta,
+            avg_theta,
+            avg_dfa,
+            avg_spectral_entropy AS avg_entropy
+        FROM gold_grouped_stats
+        WHERE grouping_id = 2
         ORDER BY subject
     """)
     
+    con.execute("DROP TABLE gold_grouped_stats")
+    
     print("  ✓ gold_workload_stats created")
     print("  ✓ gold_subject_stats created")
     
@@ -398,45 +684,64 @@ def create_gold_layer(con: duckdb.DuckDBPyConnection) -> None:
 
 def create_embeddings(con: duckdb.DuckDBPyConnection) -> None:
     """Generate FAISS embeddings for semantic search"""
+    # Heavy deps (PyTorch, FAISS) are only loaded when embeddings are built
+    import faiss
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
     print("\n[EMBEDDINGS] Creating FAISS index...")
     
     # Sample features for embedding (to keep size manageable)
-    df = con.execute("""
+    features = con.execute("""
         SELECT 
             subject, channel, window_idx, window_start,
             alpha_power, beta_power, theta_power, 
             dfa_alpha, spectral_entropy, mean_val
         FROM silver_eeg_features
         LIMIT 10000
-    """).fetch_df()
+    """).fetch_arrow_table()
     
-    if len(df) == 0:
+    if features.num_rows == 0:
         print("  ! No data to embed")
         return
     
-    # Create descriptive narratives
-    narratives = []
-    for _, row in df.iterrows():
-        narrative = (
-            f"Subject {row['subject']} channel {row['channel']} "
-            f"alpha {row['alpha_power']:.2e} beta {row['beta_power']:.2e} "
-            f"theta {row['theta_power']:.2e} DFA {row['dfa_alpha']:.3f} "
-            f"entropy {row['spectral_entropy']:.2f}"
-        )
-        narratives.append(narrative)
+    # Create descriptive narratives (plain dicts straight from Arrow, no DataFrame)
+    narratives = [
+        f"Subject {row['subject']} channel {row['channel']} "
+        f"alpha {row['alpha_power']:.2e} beta {row['beta_power']:.2e} "
+        f"theta {row['theta_power']:.2e} DFA {row['dfa_alpha']:.3f} "
+        f"entropy {row['spectral_entropy']:.2f}"
+        for row in features.to_pylist()
+    ]
     
     print(f"  Encoding {len(narratives)} windows...")
     
-    # Load embedding model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = model.encode(narratives, show_progress_bar=True, batch_size=32)
+    # Load embedding model (FP16 on GPU when available)
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+    if device == 'cuda':
+        model = model.half()
+    
+    # Unit-length embeddings, so inner product == cosine similarity
+    embeddings = model.encode(
+        narratives,
+        batch_size=256,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=True
+    )
     embeddings = np.array(embeddings, dtype=np.float32)
     
-    print(f"  Embeddings shape: {embeddings.shape}")
+    print(f"  Embeddings shape: {embeddings.shape} ({device})")
     
-    # Build FAISS index
+    # Build FAISS index: HNSW graph for sub-ms approximate cosine search over
+    # 8-bit scalar-quantized vectors (~2.3x smaller than a flat float32 index on
+    # disk, since the M=32 graph links are stored alongside the codes)
     dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
+    index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = 64
+    index.hnsw.efSearch = 64
+    index.train(embeddings)
     index.add(embeddings)
     
     # Save index
@@ -453,8 +758,6 @@ def create_embeddings(con: duckdb.DuckDBPyConnection) -> None:
 
 def create_channel_metadata() -> None:
     """Generate channel metadata JSON"""
-    import json
-    
     metadata = {
         "channels": EEG_CHANNELS,
         "sampling_rate": SAMPLING_RATE,
@@ -502,10 +805,10 @@ def main():
     
     try:
         # BRONZE: Load raw EEG
-        load_raw_eeg_data(con)
+        subject_arrays = load_raw_eeg_data(con)
         
         # SILVER: Extract features
-        create_silver_features(con)
+        create_silver_features(con, subject_arrays)
         
         # GOLD: Create analytics marts
         create_gold_layer(con)